@@ -2,29 +2,106 @@
 import boto3
 import os
 import json
+import logging
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+# Per-attempt polling and endpoint details are DEBUG; set the log_level variable to DEBUG to see them
+logger = logging.getLogger()
+_LOG_LEVEL = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger.setLevel(_LOG_LEVEL if isinstance(_LOG_LEVEL, int) else logging.INFO)
+
+# orjson is faster than stdlib json but optional; fall back when it isn't packaged
+try:
+    import orjson
+
+    _loads = orjson.loads
+
+    def _dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    _loads = json.loads
+    _dumps = json.dumps
+
+# Upper bound on concurrent create_user calls, to stay under Transfer API throttling limits
+MAX_USER_WORKERS = 10
+
+# describe_server polling backoff: start at POLL_INITIAL_DELAY, grow 1.5x, cap at POLL_MAX_DELAY
+POLL_INITIAL_DELAY = 2
+POLL_MAX_DELAY = 30
+
+# Keep-alive connections sized for the worker pool, with adaptive retries under throttling
+_CLIENT_CONFIG = Config(
+    retries={'max_attempts': 5, 'mode': 'adaptive'},
+    tcp_keepalive=True,
+    max_pool_connections=MAX_USER_WORKERS
+)
+
+# Created once per container so warm invocations reuse clients and resolved credentials
+_TRANSFER = boto3.client('transfer', config=_CLIENT_CONFIG)
+_ROUTE53 = boto3.client('route53', config=_CLIENT_CONFIG)
+# The transfer client's region is the region every server is created in
+_REGION = _TRANSFER.meta.region_name or os.environ.get('AWS_REGION', 'us-east-1')
+
+@dataclass(frozen=True)
+class UserCfg:
+    """One validated entry from SFTP_USER_CONFIGS"""
+    username: str
+    home_dir: str
+    public_key: str = ''
+
+def parse_user_configs(raw_configs):
+    """Validate the decoded SFTP_USER_CONFIGS list into UserCfg entries"""
+    if not isinstance(raw_configs, list):
+        raise ValueError("expected a JSON list of user objects")
+    
+    user_configs = []
+    for index, raw_config in enumerate(raw_configs):
+        if not isinstance(raw_config, dict):
+            raise ValueError(f"user {index} must be an object")
+        for field in ('username', 'home_dir'):
+            if not isinstance(raw_config.get(field), str) or not raw_config[field]:
+                raise ValueError(f"user {index} is missing required field '{field}'")
+        public_key = raw_config.get('public_key')
+        if public_key is None:
+            public_key = ''
+        elif not isinstance(public_key, str):
+            raise ValueError(f"user {index} field 'public_key' must be a string")
+        user_configs.append(UserCfg(
+            username=raw_config['username'],
+            home_dir=raw_config['home_dir'],
+            public_key=public_key
+        ))
+    return user_configs
+
+# User configs are static for the container's lifetime, so parse and validate them once at cold start
+try:
+    _SFTP_USER_CONFIGS = parse_user_configs(_loads(os.environ['SFTP_USER_CONFIGS']))
+except (KeyError, ValueError) as e:
+    logger.error(f"Error parsing SFTP_USER_CONFIGS: {e}")
+    _SFTP_USER_CONFIGS = None
+
 def lambda_handler(event, context):
     """
     Lambda function to create new SFTP server and update DNS alias
     """
-    transfer = boto3.client('transfer')
-    route53 = boto3.client('route53')
+    transfer = _TRANSFER
+    route53 = _ROUTE53
     
     server_name = os.environ['SERVER_NAME']
     sftp_role_arn = os.environ['SFTP_ROLE_ARN']
     user_role_arn = os.environ['USER_ROLE_ARN']
     s3_bucket = os.environ['S3_BUCKET']
     
-    # Parse the user configs from JSON string
-    try:
-        sftp_user_configs = json.loads(os.environ['SFTP_USER_CONFIGS'])
-    except json.JSONDecodeError as e:
-        print(f"Error parsing SFTP_USER_CONFIGS: {e}")
+    sftp_user_configs = _SFTP_USER_CONFIGS
+    if sftp_user_configs is None:
         return {
             'statusCode': 400,
-            'body': json.dumps({'error': 'Invalid SFTP_USER_CONFIGS format. Must be valid JSON.'})
+            'body': _dumps({'error': 'Invalid SFTP_USER_CONFIGS. Must be a JSON list of users with username and home_dir.'})
         }
     
     # DNS configuration
@@ -33,12 +110,12 @@ def lambda_handler(event, context):
     hosted_zone_id = os.environ.get('HOSTED_ZONE_ID', '')
     
     try:
-        print(f"Starting SFTP server creation process for: {server_name}")
-        print(f"DNS Config - Domain: {domain_name}, Subdomain: {sftp_subdomain}, Zone ID: {hosted_zone_id}")
-        print(f"Creating {len(sftp_user_configs)} users")
+        logger.info(f"Starting SFTP server creation process for: {server_name}")
+        logger.debug(f"DNS Config - Domain: {domain_name}, Subdomain: {sftp_subdomain}, Zone ID: {hosted_zone_id}")
+        logger.debug(f"Creating {len(sftp_user_configs)} users")
         
         # Always create a new server (as requested)
-        print("Creating new SFTP server...")
+        logger.debug("Creating new SFTP server...")
         create_response = transfer.create_server(
             IdentityProviderType='SERVICE_MANAGED',
             Protocols=['SFTP'],
@@ -53,107 +130,66 @@ def lambda_handler(event, context):
         )
         
         server_id = create_response['ServerId']
-        print(f"✓ Created SFTP server: {server_id}")
-        
-        # Wait for server to be online
-        print("Waiting for server to come online...")
-        wait_for_server_online(transfer, server_id)
+        logger.info(f"✓ Created SFTP server: {server_id}")
         
-        # Get server details with retry for endpoint
-        print("Getting server hostname...")
-        server_hostname = None
-        max_hostname_attempts = 5
+        # Wait for server to be online and report its hostname in a single poll loop
+        logger.debug("Waiting for server to come online...")
+        server_hostname = wait_for_server_ready(transfer, server_id)
         
-        for attempt in range(max_hostname_attempts):
-            server_info = transfer.describe_server(ServerId=server_id)
-            server_hostname = get_server_hostname(server_info)
-            
-            if server_hostname and server_hostname != "None":
-                print(f"✓ Server hostname obtained: {server_hostname}")
-                break
-            else:
-                print(f"Attempt {attempt + 1}: Hostname not yet available, waiting 30 seconds...")
-                if attempt < max_hostname_attempts - 1:
-                    time.sleep(30)
-        
-        if server_hostname == "None":
-            print("❌ Failed to get server hostname after multiple attempts")
-            # Fallback: construct hostname manually
-            region = boto3.Session().region_name
-            server_hostname = f"{server_id}.server.transfer.{region}.amazonaws.com"
-            print(f"Using constructed hostname: {server_hostname}")
-        
-        print(f"✓ Server is online with hostname: {server_hostname}")
+        logger.info(f"✓ Server is online with hostname: {server_hostname}")
         
         # Update Route 53 CNAME if configured
         alias_hostname = None
         if domain_name and hosted_zone_id and server_hostname:
             alias_hostname = f"{sftp_subdomain}.{domain_name}"
-            print(f"Updating DNS record: {alias_hostname} -> {server_hostname}")
+            logger.debug(f"Updating DNS record: {alias_hostname} -> {server_hostname}")
             
             try:
-                update_dns_record(route53, hosted_zone_id, alias_hostname, server_hostname)
-                print(f"✓ Successfully updated DNS: {alias_hostname} -> {server_hostname}")
-                
-                # Verify DNS update
-                verify_dns_update(route53, hosted_zone_id, alias_hostname, server_hostname)
+                update_dns_records(route53, hosted_zone_id, [(alias_hostname, server_hostname)])
+                logger.info(f"✓ Successfully updated DNS: {alias_hostname} -> {server_hostname}")
                 
             except Exception as dns_error:
-                print(f"❌ Failed to update DNS: {str(dns_error)}")
+                logger.error(f"❌ Failed to update DNS: {str(dns_error)}")
                 # Continue with user creation even if DNS fails
         else:
-            print("⚠️ DNS update skipped - missing domain configuration")
+            logger.warning("⚠️ DNS update skipped - missing domain configuration")
             if not domain_name:
-                print("  - DOMAIN_NAME not set")
+                logger.warning("  - DOMAIN_NAME not set")
             if not hosted_zone_id:
-                print("  - HOSTED_ZONE_ID not set")
+                logger.warning("  - HOSTED_ZONE_ID not set")
             if not server_hostname:
-                print("  - server_hostname not available")
+                logger.warning("  - server_hostname not available")
         
         # Create SFTP users
-        print(f"Creating users on server {server_id}")
+        logger.debug(f"Creating users on server {server_id}")
         created_users = []
+        connection_examples = []
+        connection_hostname = alias_hostname if alias_hostname else server_hostname
+        connection_suffix = f"@{connection_hostname}"
+        server_tag = {'Key': 'ServerName', 'Value': server_name}
         
-        for sftp_user_config in sftp_user_configs:
-            try:
-                username = sftp_user_config['username']
-                home_dir = sftp_user_config['home_dir']
-                public_key = sftp_user_config.get('public_key', '')
-                
-                print(f"Creating user: {username}")
-                
-                create_user_response = transfer.create_user(
-                    ServerId=server_id,
-                    UserName=username,
-                    Role=user_role_arn,
-                    HomeDirectory=f'/{s3_bucket}{home_dir}',
-                    HomeDirectoryType='PATH',
-                    SshPublicKeyBody=public_key,
-                    Tags=[
-                        {'Key': 'Name', 'Value': username},
-                        {'Key': 'ServerName', 'Value': server_name}
-                    ]
-                )
-                
-                user_info = {
-                    'username': username,
-                    'home_directory': f'/{s3_bucket}{home_dir}',
-                    'user_arn': create_user_response.get('UserName', username)
-                }
-                created_users.append(user_info)
-                
-                print(f"✓ Created user {username}")
-                
-            except KeyError as e:
-                print(f"❌ Missing required field for user: {e}")
-                continue
-            except Exception as e:
-                print(f"❌ Failed to create user {sftp_user_config.get('username', 'unknown')}: {e}")
-                continue
+        with ThreadPoolExecutor(max_workers=MAX_USER_WORKERS) as executor:
+            futures = [
+                (sftp_user_config, executor.submit(
+                    _create_one_user, transfer, server_id, server_tag,
+                    user_role_arn, s3_bucket, sftp_user_config
+                ))
+                for sftp_user_config in sftp_user_configs
+            ]
+            
+            # Collect in submission order so the response lists users as configured
+            for sftp_user_config, future in futures:
+                try:
+                    user_info = future.result()
+                    created_users.append(user_info)
+                    connection_examples.append(f"sftp {user_info['username']}{connection_suffix}")
+                    logger.debug(f"✓ Created user {user_info['username']}")
+                    
+                except Exception as e:
+                    logger.error(f"❌ Failed to create user {sftp_user_config.username}: {e}")
+                    continue
         
         # Prepare response
-        connection_hostname = alias_hostname if alias_hostname else server_hostname
-        
         response_body = {
             'message': f'Successfully created SFTP server with {len(created_users)} users',
             'server_id': server_id,
@@ -169,175 +205,203 @@ def lambda_handler(event, context):
             response_body['alias_hostname'] = alias_hostname
         
         # Add connection examples for each user
-        response_body['connection_examples'] = [
-            f"sftp {user['username']}@{connection_hostname}" 
-            for user in created_users
-        ]
+        response_body['connection_examples'] = connection_examples
         
-        print(f"✓ SFTP server setup complete!")
-        print(f"✓ Created {len(created_users)} users")
+        logger.info(f"✓ SFTP server setup complete!")
+        logger.info(f"✓ Created {len(created_users)} users")
         if alias_hostname:
-            print(f"Connect using: sftp <username>@{alias_hostname}")
+            logger.debug(f"Connect using: sftp <username>@{alias_hostname}")
         else:
-            print(f"Connect using: sftp <username>@{server_hostname}")
+            logger.debug(f"Connect using: sftp <username>@{server_hostname}")
         
         return {
             'statusCode': 200,
-            'body': json.dumps(response_body, indent=2)
+            'body': _dumps(response_body)
         }
         
     except ClientError as e:
         error_code = e.response['Error']['Code']
         error_message = e.response['Error']['Message']
-        print(f"AWS Error [{error_code}]: {error_message}")
+        logger.error(f"AWS Error [{error_code}]: {error_message}")
         
         return {
             'statusCode': 500,
-            'body': json.dumps({
+            'body': _dumps({
                 'error': f'AWS Error: {error_message}',
                 'error_code': error_code
             })
         }
         
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
+        logger.error(f"Unexpected error: {str(e)}")
         return {
             'statusCode': 500,
-            'body': json.dumps({
+            'body': _dumps({
                 'error': f'Unexpected error: {str(e)}'
             })
         }
 
+def _create_one_user(transfer, server_id, server_tag, user_role_arn, s3_bucket, sftp_user_config):
+    """Create a single SFTP user; runs on a worker thread sharing the transfer client"""
+    username = sftp_user_config.username
+    home_directory = f'/{s3_bucket}{sftp_user_config.home_dir}'
+    
+    logger.debug(f"Creating user: {username}")
+    
+    create_user_response = transfer.create_user(
+        ServerId=server_id,
+        UserName=username,
+        Role=user_role_arn,
+        HomeDirectory=home_directory,
+        HomeDirectoryType='PATH',
+        SshPublicKeyBody=sftp_user_config.public_key,
+        Tags=[
+            {'Key': 'Name', 'Value': username},
+            server_tag
+        ]
+    )
+    
+    return {
+        'username': username,
+        'home_directory': home_directory,
+        'user_arn': create_user_response.get('UserName', username)
+    }
+
 def get_server_hostname(server_info):
     """Extract the actual hostname from server info"""
     server = server_info['Server']
     
     # Debug: Print server info to understand the structure
-    print(f"Server endpoint type: {server.get('EndpointType')}")
-    print(f"Server endpoint: {server.get('Endpoint')}")
-    print(f"Server ID: {server.get('ServerId')}")
+    logger.debug(f"Server endpoint type: {server.get('EndpointType')}")
+    logger.debug(f"Server endpoint: {server.get('Endpoint')}")
+    logger.debug(f"Server ID: {server.get('ServerId')}")
     
     # For PUBLIC endpoint type (most common)
     endpoint = server.get('Endpoint')
     if endpoint:
-        print(f"Found endpoint: {endpoint}")
+        logger.debug(f"Found endpoint: {endpoint}")
         return endpoint
     
     # If no endpoint yet, construct hostname from server ID and region
     server_id = server.get('ServerId')
     if server_id:
-        # Get region from the server ARN or use current session region
-        region = None
-        if 'Arn' in server:
-            # ARN format: arn:aws:transfer:region:account:server/server-id
-            arn_parts = server['Arn'].split(':')
-            if len(arn_parts) >= 4:
-                region = arn_parts[3]
-        
-        if not region:
-            region = boto3.Session().region_name or 'us-east-1'
-        
-        constructed_hostname = f"{server_id}.server.transfer.{region}.amazonaws.com"
-        print(f"Constructed hostname: {constructed_hostname}")
+        constructed_hostname = f"{server_id}.server.transfer.{_REGION}.amazonaws.com"
+        logger.debug(f"Constructed hostname: {constructed_hostname}")
         return constructed_hostname
     
-    print("ERROR: Could not determine server hostname")
+    logger.error("ERROR: Could not determine server hostname")
     return None
 
-def update_dns_record(route53, hosted_zone_id, record_name, target_hostname):
-    """Update Route 53 CNAME record to point to new server"""
+def update_dns_records(route53, hosted_zone_id, changes):
+    """Upsert Route 53 CNAME records from (name, target) pairs in a single change batch"""
     try:
-        print(f"Updating DNS record in zone {hosted_zone_id}")
-        print(f"Record: {record_name} -> {target_hostname}")
+        logger.debug(f"Updating {len(changes)} DNS record(s) in zone {hosted_zone_id}")
+        for record_name, target_hostname in changes:
+            logger.debug(f"Record: {record_name} -> {target_hostname}")
         
+        # Route 53 applies every change in a batch atomically, so one call covers all records
         response = route53.change_resource_record_sets(
             HostedZoneId=hosted_zone_id,
             ChangeBatch={
                 'Comment': f'Updated by Lambda for SFTP server - {int(time.time())}',
-                'Changes': [{
-                    'Action': 'UPSERT',
-                    'ResourceRecordSet': {
-                        'Name': record_name,
-                        'Type': 'CNAME',
-                        'TTL': 60,
-                        'ResourceRecords': [{'Value': target_hostname}]
+                'Changes': [
+                    {
+                        'Action': 'UPSERT',
+                        'ResourceRecordSet': {
+                            'Name': record_name,
+                            'Type': 'CNAME',
+                            'TTL': 60,
+                            'ResourceRecords': [{'Value': target_hostname}]
+                        }
                     }
-                }]
+                    for record_name, target_hostname in changes
+                ]
             }
         )
         
         change_id = response['ChangeInfo']['Id']
-        print(f"DNS change submitted with ID: {change_id}")
-        
-        # Wait for change to propagate (optional, but good for verification)
-        waiter = route53.get_waiter('resource_record_sets_changed')
-        print("Waiting for DNS change to propagate...")
-        waiter.wait(Id=change_id, WaiterConfig={'Delay': 5, 'MaxAttempts': 12})
+        logger.debug(f"DNS change submitted with ID: {change_id}")
         
-        print(f"✓ DNS change completed successfully")
+        for record_name, target_hostname in changes:
+            verify_dns_update(route53, hosted_zone_id, record_name, target_hostname)
         return True
         
     except ClientError as e:
         error_code = e.response['Error']['Code']
         error_message = e.response['Error']['Message']
-        print(f"❌ Route53 ClientError [{error_code}]: {error_message}")
+        logger.error(f"❌ Route53 ClientError [{error_code}]: {error_message}")
         raise Exception(f"Route53 Error: {error_message}")
     except Exception as e:
-        print(f"❌ Unexpected DNS error: {str(e)}")
+        logger.error(f"❌ Unexpected DNS error: {str(e)}")
         raise
 
+def get_cname_value(route53, hosted_zone_id, record_name):
+    """Return the current CNAME target for record_name, or None if it doesn't exist"""
+    response = route53.list_resource_record_sets(
+        HostedZoneId=hosted_zone_id,
+        StartRecordName=record_name,
+        StartRecordType='CNAME',
+        MaxItems='1'
+    )
+    
+    for record_set in response.get('ResourceRecordSets', []):
+        if record_set['Name'].rstrip('.') == record_name and record_set['Type'] == 'CNAME':
+            return record_set['ResourceRecords'][0]['Value']
+    
+    return None
+
 def verify_dns_update(route53, hosted_zone_id, record_name, expected_value):
-    """Verify that the DNS record was updated correctly"""
+    """Verify that the DNS record was updated correctly, polling briefly for the change"""
     try:
-        print(f"Verifying DNS record: {record_name}")
-        
-        response = route53.list_resource_record_sets(
-            HostedZoneId=hosted_zone_id,
-            StartRecordName=record_name,
-            StartRecordType='CNAME',
-            MaxItems='1'
-        )
+        logger.debug(f"Verifying DNS record: {record_name}")
         
-        for record_set in response.get('ResourceRecordSets', []):
-            if record_set['Name'].rstrip('.') == record_name and record_set['Type'] == 'CNAME':
-                current_value = record_set['ResourceRecords'][0]['Value']
-                if current_value == expected_value:
-                    print(f"✓ DNS verification successful: {record_name} = {current_value}")
-                    return True
-                else:
-                    print(f"⚠️ DNS value mismatch: expected {expected_value}, got {current_value}")
-                    return False
+        # Back off 1s, 2s, 4s between checks (~7s total) instead of waiting on the change status
+        for delay in [1, 2, 4, None]:
+            current_value = get_cname_value(route53, hosted_zone_id, record_name)
+            if current_value == expected_value:
+                logger.debug(f"✓ DNS verification successful: {record_name} = {current_value}")
+                return True
+            if delay is not None:
+                time.sleep(delay)
         
-        print(f"⚠️ CNAME record not found: {record_name}")
+        if current_value is None:
+            logger.warning(f"⚠️ CNAME record not found: {record_name}")
+        else:
+            logger.warning(f"⚠️ DNS value mismatch: expected {expected_value}, got {current_value}")
         return False
         
     except Exception as e:
-        print(f"⚠️ DNS verification failed: {str(e)}")
+        logger.warning(f"⚠️ DNS verification failed: {str(e)}")
         return False
 
-def wait_for_server_online(transfer, server_id, max_wait_time=300):
-    """Wait for server to come online"""
-    print(f"Waiting for server {server_id} to come online...")
+def wait_for_server_ready(transfer, server_id, max_wait_time=300):
+    """Wait for server to come online and return its hostname"""
+    logger.debug(f"Waiting for server {server_id} to come online...")
     start_time = time.time()
+    delay = POLL_INITIAL_DELAY
+    
+    # New servers essentially never report ONLINE within the first few seconds
+    time.sleep(5)
     
     while time.time() - start_time < max_wait_time:
         try:
             server_info = transfer.describe_server(ServerId=server_id)
-            state = server_info['Server']['State']
-            
-            if state == 'ONLINE':
-                print(f"Server {server_id} is now online")
-                return True
-            elif state in ['STOP_FAILED', 'START_FAILED']:
-                raise Exception(f"Server {server_id} failed to start. State: {state}")
-            
-            print(f"Server {server_id} state: {state}. Waiting...")
-            time.sleep(10)
-            
         except ClientError as e:
             if e.response['Error']['Code'] == 'ResourceNotFoundException':
-                print(f"Server {server_id} not found")
-                return False
+                logger.error(f"Server {server_id} not found")
             raise
+        
+        state = server_info['Server']['State']
+        
+        # get_server_hostname falls back to the ID-based hostname, so ONLINE is sufficient
+        if state == 'ONLINE':
+            logger.info(f"Server {server_id} is now online")
+            return get_server_hostname(server_info)
+        elif state in ['STOP_FAILED', 'START_FAILED']:
+            raise Exception(f"Server {server_id} failed to start. State: {state}")
+        
+        logger.debug(f"Server {server_id} state: {state}. Waiting...")
+        time.sleep(delay + random.uniform(0, delay * 0.1))
+        delay = min(delay * 1.5, POLL_MAX_DELAY)
     
-    raise Exception(f"Server {server_id} did not come online within {max_wait_time} seconds")
\ No newline at end of file
+    raise Exception(f"Server {server_id} did not come online within {max_wait_time} seconds")
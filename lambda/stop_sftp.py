@@ -2,27 +2,68 @@
 import boto3
 import os
 import json
+import logging
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+# Per-attempt polling and endpoint details are DEBUG; set the log_level variable to DEBUG to see them
+logger = logging.getLogger()
+_LOG_LEVEL = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger.setLevel(_LOG_LEVEL if isinstance(_LOG_LEVEL, int) else logging.INFO)
+
+# orjson is faster than stdlib json but optional; fall back when it isn't packaged
+try:
+    import orjson
+
+    def _dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    _dumps = json.dumps
+
+# Upper bound on concurrent delete_user calls, to stay under Transfer API throttling limits
+MAX_USER_WORKERS = 10
+
+# describe_server polling backoff: start at POLL_INITIAL_DELAY, grow 1.5x, cap at POLL_MAX_DELAY
+POLL_INITIAL_DELAY = 2
+POLL_MAX_DELAY = 30
+
+# Keep-alive connections sized for the worker pool, with adaptive retries under throttling
+_CLIENT_CONFIG = Config(
+    retries={'max_attempts': 5, 'mode': 'adaptive'},
+    tcp_keepalive=True,
+    max_pool_connections=MAX_USER_WORKERS
+)
+
+# Created once per container so warm invocations reuse clients and resolved credentials
+_TRANSFER = boto3.client('transfer', config=_CLIENT_CONFIG)
+_TAGGING = boto3.client('resourcegroupstaggingapi', config=_CLIENT_CONFIG)
+
+# Server ARN -> (fetched_at, tags) memo for the fallback scan, shared by warm invocations
+TAG_CACHE_TTL = 300
+_TAG_CACHE = {}
+
 def lambda_handler(event, context):
     """
     Lambda function to stop and delete SFTP server
     """
-    transfer = boto3.client('transfer')
+    transfer = _TRANSFER
+    tagging = _TAGGING
     server_name = os.environ['SERVER_NAME']
     
     try:
-        print(f"Starting SFTP server deletion process for: {server_name}")
+        logger.info(f"Starting SFTP server deletion process for: {server_name}")
         
         # Find server by name tag
-        server_id = find_server_by_name(transfer, server_name)
+        server_id = find_server_by_name(transfer, tagging, server_name)
         
         if not server_id:
-            print(f"No server found with name: {server_name}")
+            logger.info(f"No server found with name: {server_name}")
             return {
                 'statusCode': 200,
-                'body': json.dumps({
+                'body': _dumps({
                     'message': f'No server found with name {server_name}',
                     'action': 'none_required'
                 })
@@ -32,54 +73,52 @@ def lambda_handler(event, context):
         server_info = transfer.describe_server(ServerId=server_id)
         current_state = server_info['Server']['State']
         
-        print(f"Found server {server_id} in state: {current_state}")
+        logger.info(f"Found server {server_id} in state: {current_state}")
         
         # Delete all users first
         try:
-            users_response = transfer.list_users(ServerId=server_id)
-            for user in users_response.get('Users', []):
-                username = user['UserName']
-                print(f"Deleting user: {username}")
-                transfer.delete_user(ServerId=server_id, UserName=username)
-                print(f"Deleted user: {username}")
+            usernames = [
+                user['UserName']
+                for page in transfer.get_paginator('list_users').paginate(ServerId=server_id)
+                for user in page.get('Users', [])
+            ]
+            
+            with ThreadPoolExecutor(max_workers=MAX_USER_WORKERS) as executor:
+                futures = [
+                    (username, executor.submit(_delete_user, transfer, server_id, username))
+                    for username in usernames
+                ]
+                for username, future in futures:
+                    try:
+                        future.result()
+                    except ClientError as e:
+                        logger.error(f"Error deleting user {username}: {e}")
         except ClientError as e:
-            print(f"Error deleting users: {e}")
+            logger.error(f"Error deleting users: {e}")
             # Continue with server deletion even if user deletion fails
         
         # Stop server if it's running
         if current_state == 'ONLINE':
-            print(f"Stopping server {server_id}")
+            logger.info(f"Stopping server {server_id}")
             transfer.stop_server(ServerId=server_id)
             
             # Wait for server to stop
             wait_for_server_stopped(transfer, server_id)
         elif current_state in ['STOPPING', 'OFFLINE']:
-            print(f"Server {server_id} is already stopping or offline")
+            logger.info(f"Server {server_id} is already stopping or offline")
             if current_state == 'STOPPING':
                 wait_for_server_stopped(transfer, server_id)
         else:
-            print(f"Server {server_id} is in state {current_state}")
+            logger.info(f"Server {server_id} is in state {current_state}")
         
         # Delete the server
-        print(f"Deleting server {server_id}")
-        transfer.delete_server(ServerId=server_id)
-        
-        # Verify deletion
-        try:
-            # Wait a moment for deletion to process
-            time.sleep(5)
-            transfer.describe_server(ServerId=server_id)
-            # If we get here, server still exists
-            print(f"Server {server_id} deletion initiated but may still be processing")
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'ResourceNotFoundException':
-                print(f"Server {server_id} successfully deleted")
-            else:
-                print(f"Unexpected error checking server deletion: {e}")
+        logger.info(f"Deleting server {server_id}")
+        delete_response = transfer.delete_server(ServerId=server_id)
+        logger.info(f"Server {server_id} deleted (request ID: {delete_response['ResponseMetadata'].get('RequestId')})")
         
         return {
             'statusCode': 200,
-            'body': json.dumps({
+            'body': _dumps({
                 'message': f'Successfully deleted SFTP server {server_id}',
                 'server_id': server_id,
                 'previous_state': current_state,
@@ -90,50 +129,83 @@ def lambda_handler(event, context):
     except ClientError as e:
         error_code = e.response['Error']['Code']
         error_message = e.response['Error']['Message']
-        print(f"AWS Error [{error_code}]: {error_message}")
+        logger.error(f"AWS Error [{error_code}]: {error_message}")
         
         return {
             'statusCode': 500,
-            'body': json.dumps({
+            'body': _dumps({
                 'error': f'AWS Error: {error_message}',
                 'error_code': error_code
             })
         }
         
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
+        logger.error(f"Unexpected error: {str(e)}")
         return {
             'statusCode': 500,
-            'body': json.dumps({
+            'body': _dumps({
                 'error': f'Unexpected error: {str(e)}'
             })
         }
 
-def find_server_by_name(transfer, server_name):
+def _delete_user(transfer, server_id, username):
+    """Delete a single SFTP user; runs on a worker thread sharing the transfer client"""
+    logger.debug(f"Deleting user: {username}")
+    transfer.delete_user(ServerId=server_id, UserName=username)
+    logger.debug(f"Deleted user: {username}")
+
+def find_server_by_name(transfer, tagging, server_name):
     """Find server by name tag"""
     try:
-        servers = transfer.list_servers()
-        
-        for server in servers['Servers']:
-            try:
-                tags_response = transfer.list_tags_for_resource(Arn=server['Arn'])
-                for tag in tags_response.get('Tags', []):
-                    if tag['Key'] == 'Name' and tag['Value'] == server_name:
-                        return server['ServerId']
-            except ClientError:
-                # Skip servers we can't get tags for
-                continue
+        # Single lookup against the tagging index instead of one tag call per server
+        response = tagging.get_resources(
+            TagFilters=[{'Key': 'Name', 'Values': [server_name]}],
+            ResourceTypeFilters=['transfer:server']
+        )
+        for resource in response.get('ResourceTagMappingList', []):
+            # ARN format: arn:aws:transfer:region:account:server/server-id
+            return resource['ResourceARN'].split('/')[-1]
+    except Exception as e:
+        logger.warning(f"Tag lookup failed, falling back to server scan: {str(e)}")
+    
+    # The tagging index can lag behind newly created servers, so scan as a fallback
+    return find_server_by_name_scan(transfer, server_name)
+
+def find_server_by_name_scan(transfer, server_name):
+    """Find server by listing all servers and checking each one's name tag"""
+    try:
+        for page in transfer.get_paginator('list_servers').paginate():
+            for server in page['Servers']:
+                try:
+                    for tag in _get_tags(transfer, server['Arn']):
+                        if tag['Key'] == 'Name' and tag['Value'] == server_name:
+                            return server['ServerId']
+                except ClientError:
+                    # Skip servers we can't get tags for
+                    continue
                 
         return None
         
     except Exception as e:
-        print(f"Error finding server: {str(e)}")
+        logger.error(f"Error finding server: {str(e)}")
         return None
 
+def _get_tags(transfer, arn):
+    """Return the tags for a resource, memoized for TAG_CACHE_TTL seconds"""
+    now = time.time()
+    cached = _TAG_CACHE.get(arn)
+    if cached and now - cached[0] < TAG_CACHE_TTL:
+        return cached[1]
+    
+    tags = transfer.list_tags_for_resource(Arn=arn).get('Tags', [])
+    _TAG_CACHE[arn] = (now, tags)
+    return tags
+
 def wait_for_server_stopped(transfer, server_id, max_wait_time=300):
     """Wait for server to stop"""
-    print(f"Waiting for server {server_id} to stop...")
+    logger.debug(f"Waiting for server {server_id} to stop...")
     start_time = time.time()
+    delay = POLL_INITIAL_DELAY
     
     while time.time() - start_time < max_wait_time:
         try:
@@ -141,20 +213,21 @@ def wait_for_server_stopped(transfer, server_id, max_wait_time=300):
             state = server_info['Server']['State']
             
             if state == 'OFFLINE':
-                print(f"Server {server_id} is now offline")
+                logger.info(f"Server {server_id} is now offline")
                 return True
             elif state == 'STOP_FAILED':
-                print(f"Server {server_id} failed to stop. Proceeding with deletion anyway.")
+                logger.warning(f"Server {server_id} failed to stop. Proceeding with deletion anyway.")
                 return True
             
-            print(f"Server {server_id} state: {state}. Waiting...")
-            time.sleep(10)
+            logger.debug(f"Server {server_id} state: {state}. Waiting...")
+            time.sleep(delay + random.uniform(0, delay * 0.1))
+            delay = min(delay * 1.5, POLL_MAX_DELAY)
             
         except ClientError as e:
             if e.response['Error']['Code'] == 'ResourceNotFoundException':
-                print(f"Server {server_id} no longer exists")
+                logger.info(f"Server {server_id} no longer exists")
                 return True
             raise
     
-    print(f"Server {server_id} did not stop within {max_wait_time} seconds. Proceeding with deletion anyway.")
+    logger.warning(f"Server {server_id} did not stop within {max_wait_time} seconds. Proceeding with deletion anyway.")
     return False
\ No newline at end of file
@@ -71,6 +71,12 @@ variable "sftp_subdomain" {
   default     = "server"
 }
 
+variable "log_level" {
+  description = "Log level for the Lambda functions (e.g., INFO, DEBUG)"
+  type        = string
+  default     = "INFO"
+}
+
 # Data sources
 data "aws_caller_identity" "current" {}
 data "aws_region" "current" {}
@@ -292,6 +298,13 @@ resource "aws_iam_role_policy" "lambda_transfer_policy" {
         ]
         Resource = "*"
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "tag:GetResources"
+        ]
+        Resource = "*"
+      },
       {
         Effect = "Allow"
         Action = [
@@ -306,12 +319,10 @@ resource "aws_iam_role_policy" "lambda_transfer_policy" {
         Effect = "Allow"
         Action = [
           "route53:ChangeResourceRecordSets",
-          "route53:GetChange",
           "route53:ListResourceRecordSets"
         ]
         Resource = local.hosted_zone_id != "" ? [
-          "arn:aws:route53:::hostedzone/${local.hosted_zone_id}",
-          "arn:aws:route53:::change/*"
+          "arn:aws:route53:::hostedzone/${local.hosted_zone_id}"
         ] : ["*"]
       },
       {
@@ -346,6 +357,7 @@ resource "aws_lambda_function" "start_sftp" {
       DOMAIN_NAME      = var.domain_name
       SFTP_SUBDOMAIN   = var.sftp_subdomain
       HOSTED_ZONE_ID   = local.hosted_zone_id  # Fixed: Use local instead of direct reference
+      LOG_LEVEL        = var.log_level
     } 
   }
 
@@ -368,6 +380,7 @@ resource "aws_lambda_function" "stop_sftp" {
   environment {
     variables = {
       SERVER_NAME = var.server_name
+      LOG_LEVEL   = var.log_level
     }
   }
 